@@ -4,6 +4,9 @@ from StateFunction import State
 from electoral_votes import electoral_votes, total_electoral_votes
 from datetime import date
 
+import itertools
+import queue
+import random
 from multiprocessing import Pool
 from os import cpu_count
 
@@ -33,16 +36,21 @@ def dict_sum(a, b):
 
 class ElectoralCollege:
     """Contains all functionality necessary to simulate the electoral college."""
-    def __init__(self, polling_data=None, parallel=True):
+    def __init__(self, polling_data=None, parallel=True, result_cache=None, seed=None):
         """
 
         :param polling_data: a polling data instance.
         :param parallel: bool representing whether or not to run the simulations in parallel.
+        :param result_cache: a ResultCache instance. When given, results of previous runs with the same inputs are
+            reused instead of simulated again.
+        :param seed: when given, each simulation is seeded from it and its number, so runs are reproducible.
         """
         self.electoral_votes = electoral_votes
         self.polling_data = polling_data or PollingData()
         self.states = {name: State(name, self.polling_data) for name in self.electoral_votes.keys()}
         self.parallel = parallel
+        self.result_cache = result_cache
+        self.seed = seed
 
     def run_one_simulation(self, candidates: List[Candidate]) -> Dict[str, Candidate]:
         """Runs a single electoral college simulation. For each state, it generates a single winner
@@ -115,35 +123,129 @@ class ElectoralCollege:
         with open(f'data/results/results{str(today_date)}.csv', 'a+') as f:
             f.write(row)
 
+    def get_cache_inputs(self, candidates: [Candidate]) -> dict:
+        """Collects everything besides the number of simulations that determines the results of run_simulations.
+
+        :param candidates: list of all candidates in the election
+        :returns a JSON-serializable dict of the inputs"""
+        polling_dictionary = self.polling_data.get_polling_dictionary()
+        return {'polls': sorted([state, name, poll] for (state, name), poll in polling_dictionary.items()),
+                'results2016': self.polling_data.fill_2016_results(),
+                'similar_states': self.polling_data.fill_state_similarity(),
+                'candidates': [[candidate.name, candidate.party, candidate.short_name] for candidate in candidates],
+                'estimator': {'polling_data': type(self.polling_data).__name__,
+                              'margin_of_error': self.polling_data.margin_of_error},
+                'sampler': {name: state.population for name, state in self.states.items()},
+                'seed': self.seed}
+
     def run_simulations(self, num_simulations: int, candidates: [Candidate], verbose=False) -> {Candidate: int}:
         """Runs the specified number of simulated elections, adds up the number of wins of each candidate, then uses
         that to approximate the probability of a win for each candidate.
 
         If verbose is specified, it prints each simulation to the console and to disk.
 
+        If the electoral college has a result cache, simulations already stored for the same inputs are reused, and
+        only the simulations past the stored ones are run. The cache stores the electoral votes of each candidate in
+        each simulation, which get_cached_simulations returns for analysis. It does not store each state's winner, so
+        the cache is skipped when verbose is specified, and every simulation is run, printed and saved to disk.
+
         :param num_simulations: the number of simulations to run
         :param candidates: list of all candidates in the election
         :param verbose: bool that if true, prints the results of each simulated election to console and disk
         :returns a dict containing the number of election wins for each candidate
         """
+        write_in_candidate = Candidate('Write-in', 'I')  # Voters can write-in, and sometimes they could win.
         candidate_win_counts = {candidate: 0 for candidate in candidates}
         candidate_win_counts[None] = 0  # Draws are totally feasible
-        write_in_candidate = Candidate('Write-in', 'I')  # Voters can write-in, and sometimes they could win.
         candidate_win_counts[write_in_candidate] = 0
 
-        if self.parallel:
-            with Pool(NUM_CPU) as pool:
-                results = pool.starmap(self.each_iteration, [(i, candidates, verbose, write_in_candidate) for i in range(num_simulations)])
-                for candidate_sums in results:
-                    candidate_win_counts[self.get_winner(candidate_sums)] += 1
-        else:
-            for i in range(num_simulations):
-                candidate_sums = self.each_iteration(i, candidates, verbose, write_in_candidate)
+        use_cache = self.result_cache is not None and not verbose
+        stored_simulations = self.get_cached_simulations(candidates)[:num_simulations] if use_cache else []
+        for candidate_sums in stored_simulations:
+            candidate_win_counts[self.get_winner(candidate_sums)] += 1
+
+        # Batches arrive in completion order, so they are keyed by their first simulation to be stored in order
+        columns = candidates + [write_in_candidate]
+        new_rows = {}
+        for batch, batch_sums in self.iterate_simulations(range(len(stored_simulations), num_simulations),
+                                                          candidates, verbose, write_in_candidate):
+            for candidate_sums in batch_sums:
                 candidate_win_counts[self.get_winner(candidate_sums)] += 1
+            if use_cache:
+                new_rows[batch.start] = [[candidate_sums.get(column, 0) for column in columns]
+                                         for candidate_sums in batch_sums]
 
+        if new_rows:
+            cache_key = self.result_cache.make_key(self.get_cache_inputs(candidates))
+            rows = [[candidate_sums.get(column, 0) for column in columns] for candidate_sums in stored_simulations]
+            rows += [row for start in sorted(new_rows) for row in new_rows[start]]
+            self.result_cache.put(cache_key, rows)
         return candidate_win_counts
 
+    def get_cached_simulations(self, candidates: [Candidate]) -> [{Candidate: int}]:
+        """Looks up the simulations stored in the result cache for the current inputs.
+
+        :param candidates: list of all candidates in the election
+        :returns the electoral votes of each candidate in each stored simulation, in order, in the same format as
+        analyze_simulation"""
+        if self.result_cache is None:
+            return []
+        columns = candidates + [Candidate('Write-in', 'I')]
+        rows = self.result_cache.get(self.result_cache.make_key(self.get_cache_inputs(candidates)))
+        return [{column: votes for column, votes in zip(columns, row) if votes} for row in rows]
+
+    def iterate_simulations(self, simulation_numbers: range, candidates: [Candidate], verbose=False,
+                            write_in_candidate=None, batch_size=100):
+        """Runs the given simulations in batches, and yields each batch as soon as it finishes. When running in
+        parallel, batches are yielded in the order they finish, and only a few batches are queued ahead of the caller,
+        so memory stays constant however many simulations are run. Closing the generator stops the remaining
+        simulations.
+
+        :param simulation_numbers: the numbers (IDs) of the simulations to run
+        :param candidates: list of all candidates in the election
+        :param verbose: bool that if true, prints the results of each simulated election to console and disk
+        :param write_in_candidate: the candidate that stands for all write-ins
+        :param batch_size: the number of simulations in each batch
+        :returns a generator of (simulation numbers, candidate sums) tuples, where the candidate sums are the electoral
+        votes of each candidate in each simulation of the batch"""
+        write_in_candidate = write_in_candidate or Candidate('Write-in', 'I')
+        batches = (simulation_numbers[start:start + batch_size] for start in range(0, len(simulation_numbers), batch_size))
+        if not self.parallel:
+            for batch in batches:
+                yield batch, self.run_batch(batch, candidates, verbose, write_in_candidate)
+            return
+
+        completed = queue.Queue()
+        with Pool(NUM_CPU) as pool:
+            def submit(batch):
+                pool.apply_async(self.run_batch, (batch, candidates, verbose, write_in_candidate),
+                                 callback=lambda batch_sums: completed.put((batch, batch_sums)),
+                                 error_callback=completed.put)
+
+            # Keep every worker busy with one batch queued behind it, and only submit more as batches are consumed
+            in_flight = 0
+            for batch in itertools.islice(batches, 2 * (NUM_CPU or 1)):
+                submit(batch)
+                in_flight += 1
+            while in_flight:
+                result = completed.get()
+                in_flight -= 1
+                if isinstance(result, BaseException):
+                    raise result
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    submit(next_batch)
+                    in_flight += 1
+                yield result
+
+    def run_batch(self, simulation_numbers: range, candidates: [Candidate], verbose: bool,
+                  write_in_candidate: Candidate) -> [{Candidate: int}]:
+        """:returns the electoral votes of each candidate in each of the given simulations"""
+        return [self.each_iteration(i, candidates, verbose, write_in_candidate) for i in simulation_numbers]
+
     def each_iteration(self, i, candidates, verbose, write_in_candidate):
+        if self.seed is not None:
+            random.seed(f'{self.seed}-{i}')
         results = self.run_one_simulation(candidates)
         candidate_sums = self.analyze_simulation(results)
         if verbose:
@@ -0,0 +1,228 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from Candidate import Candidate
+from PollingData import PollingData
+from electoral_votes import electoral_votes, total_electoral_votes
+
+
+class ForecastService:
+    """Keeps the polling model and a block of random draws resident in memory, so that the forecast can be updated
+    incrementally whenever new polls land instead of being rerun from scratch.
+
+    Each simulation uses the same model as State.get_winner, ties included: a candidate's share in a state is their
+    polling prior plus gaussian noise, and each of the state's voters picks a candidate with those probabilities.
+    The noise for every state and simulation is drawn once and cached. The voter draws would take
+    num_simulations * population floats per state, so each state caches the seed of its voter draws and regenerates
+    the identical draws when it needs them. When polls change, only the affected states' priors are recomputed and
+    re-evaluated against the cached draws."""
+
+    def __init__(self, candidates: [Candidate], polling_data=None, num_simulations=20000, population=250, seed=None):
+        """
+
+        :param candidates: list of all candidates in the election
+        :param polling_data: a polling data instance.
+        :param num_simulations: the number of simulations to keep in memory
+        :param population: the number of simulated voters in each state
+        :param seed: seed for the cached random draws. The same seed and polls always give the same forecast.
+        """
+        self.candidates = list(candidates)
+        self.write_in_candidate = Candidate('Write-in', 'I')  # Voters can write-in, and sometimes they could win.
+        self.polling_data = polling_data or PollingData()
+        self.electoral_votes = electoral_votes
+        self.num_simulations = num_simulations
+        self.population = population
+        self.lock = threading.Lock()
+
+        self.noise = {}
+        self.vote_seeds = {}
+        state_seeds = np.random.SeedSequence(seed).spawn(len(self.electoral_votes))
+        for state_name, state_seed in zip(self.electoral_votes.keys(), state_seeds):
+            noise_seed, vote_seed = state_seed.spawn(2)
+            self.noise[state_name] = np.random.default_rng(noise_seed).standard_normal(
+                (num_simulations, len(self.candidates)))
+            self.vote_seeds[state_name] = vote_seed
+
+        self.priors = {}
+        self.state_winners = {}
+        # Electoral votes of each candidate in each simulation. The last column belongs to the write-in candidate.
+        self.candidate_sums = np.zeros((num_simulations, len(self.candidates) + 1), dtype=int)
+        self.recompute_states(self.electoral_votes.keys())
+
+    def get_distribution(self, state_name: str) -> np.ndarray:
+        """:returns an array with each candidate's polling share in the state in each simulation, noise included"""
+        return self.priors[state_name] + self.polling_data.margin_of_error * self.noise[state_name] / 2
+
+    def get_vote_draws(self, state_name: str) -> np.ndarray:
+        """:returns an array with the random percentage of each voter of the state in each simulation, regenerated
+        from the state's cached seed"""
+        return np.random.default_rng(self.vote_seeds[state_name]).random((self.num_simulations, self.population))
+
+    def simulate_state(self, state_name: str) -> np.ndarray:
+        """Re-evaluates the cached draws of a state against its current polling prior.
+
+        :param state_name: the name of the state to simulate
+        :returns an array with the index of the state's winner in each simulation. The index len(candidates) is the
+        write-in candidate."""
+        # Like State.get_vote, each voter picks the first candidate whose running total exceeds their random
+        # percentage, and all the other votes must be write-ins. The first running total to exceed a percentage is
+        # also the first running maximum to exceed it, and running maxima never decrease, so the number of voters
+        # who picked one of the first i candidates is just the number of percentages below the i-th running maximum.
+        running_totals = np.maximum.accumulate(np.cumsum(self.get_distribution(state_name), axis=1), axis=1)
+        draws = self.get_vote_draws(state_name)
+
+        cumulative_votes = np.zeros((self.num_simulations, len(self.candidates) + 2), dtype=int)
+        cumulative_votes[:, -1] = self.population
+        for i in range(len(self.candidates)):
+            cumulative_votes[:, i + 1] = np.count_nonzero(draws < running_totals[:, i, np.newaxis], axis=1)
+        vote_counts = np.diff(cumulative_votes, axis=1)
+        winners = vote_counts.argmax(axis=1)
+
+        # State.get_winner_with_distribution takes the max over candidates in the order they first got a vote, so a
+        # tie goes to whichever tied candidate got a vote first. Ties are rare, so only their voters are replayed.
+        tied = np.flatnonzero(np.count_nonzero(vote_counts == vote_counts.max(axis=1, keepdims=True), axis=1) > 1)
+        if len(tied):
+            votes = np.count_nonzero(draws[tied, :, np.newaxis] >= running_totals[tied, np.newaxis, :], axis=2)
+            is_vote = votes[:, np.newaxis, :] == np.arange(len(self.candidates) + 1)[np.newaxis, :, np.newaxis]
+            first_votes = np.where(is_vote.any(axis=2), is_vote.argmax(axis=2), self.population)
+            is_leader = vote_counts[tied] == vote_counts[tied].max(axis=1, keepdims=True)
+            winners[tied] = np.where(is_leader, first_votes, self.population + 1).argmin(axis=1)
+        return winners
+
+    def recompute_states(self, state_names: [str]):
+        """Recomputes the polling prior of each given state, then swaps that state's electoral votes from its old
+        winners to its new winners in every simulation.
+
+        :param state_names: the names of the states to recompute"""
+        simulations = np.arange(self.num_simulations)
+        for state_name in state_names:
+            self.priors[state_name] = np.array(
+                self.polling_data.get_polling_distribtion(state_name, self.candidates, noise=False))
+            winners = self.simulate_state(state_name)
+            if state_name in self.state_winners:
+                self.candidate_sums[simulations, self.state_winners[state_name]] -= self.electoral_votes[state_name]
+            self.candidate_sums[simulations, winners] += self.electoral_votes[state_name]
+            self.state_winners[state_name] = winners
+
+    def get_affected_states(self, changed_state_names: {str}) -> [str]:
+        """A state's polling prior depends on its own polls, on the polls of its most similar states, and, for
+        candidates outside of the major parties, on the national polls.
+
+        :param changed_state_names: the names of the states whose polls changed
+        :returns the names of the states whose priors need to be recomputed"""
+        if 'National' in changed_state_names and any(candidate.party not in ['D', 'R', 'L', 'G']
+                                                     for candidate in self.candidates):
+            return list(self.electoral_votes.keys())
+        similar_states = self.polling_data.fill_state_similarity()
+        return [state_name for state_name in self.electoral_votes.keys()
+                if state_name in changed_state_names
+                or any(similar.strip() in changed_state_names for similar in similar_states.get(state_name, ()))]
+
+    def update_polls(self, polls: {(str, str): float}) -> [str]:
+        """Merges new polling averages into the polling data, then re-forecasts only the states they affect.
+
+        :param polls: dict with (state name, candidate name) as keys and polling averages between 0 and 1 as values
+        :returns the names of the states that were recomputed"""
+        with self.lock:
+            polling_dictionary = self.polling_data.get_polling_dictionary()
+            changed_state_names = set()
+            for (state_name, candidate_name), poll in polls.items():
+                if polling_dictionary.get((state_name, candidate_name)) != poll:
+                    polling_dictionary[(state_name, candidate_name)] = poll
+                    changed_state_names.add(state_name)
+            affected_state_names = self.get_affected_states(changed_state_names)
+            self.recompute_states(affected_state_names)
+            return affected_state_names
+
+    def reload_polls(self) -> [str]:
+        """Downloads the most recent polling data, then re-forecasts the states whose polls changed.
+
+        :returns the names of the states that were recomputed"""
+        latest_polling_data = PollingData()
+        latest_polling_data.local_uri_538 = self.polling_data.local_uri_538
+        return self.update_polls(latest_polling_data.get_polling_dictionary())
+
+    def get_win_counts(self) -> {Candidate: int}:
+        """Counts the election wins of each candidate across the cached simulations.
+
+        :returns a dict containing the number of election wins for each candidate, in the same format as
+        ElectoralCollege.run_simulations"""
+        with self.lock:
+            majority = self.candidate_sums > total_electoral_votes / 2
+            winners = np.where(majority.any(axis=1), majority.argmax(axis=1), -1)
+        candidate_win_counts = {candidate: int(np.count_nonzero(winners == i))
+                                for i, candidate in enumerate(self.candidates + [self.write_in_candidate])}
+        candidate_win_counts[None] = int(np.count_nonzero(winners == -1))  # Draws are totally feasible
+        return candidate_win_counts
+
+    def get_probabilities(self) -> {str: float}:
+        """:returns a dict with each candidate's name and party as keys and their probability of winning as values"""
+        return {str(candidate): count / self.num_simulations for candidate, count in self.get_win_counts().items()}
+
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """Serves the forecast of the server's ForecastService as JSON.
+
+    GET /forecast returns the current win probabilities.
+    POST /polls takes a JSON list of {"state": ..., "candidate": ..., "pct": ...} objects, where pct is a polling
+    average between 0 and 1, and returns the updated win probabilities.
+    POST /reload downloads the most recent polling data and returns the updated win probabilities."""
+
+    def do_GET(self):
+        if self.path == '/forecast':
+            self.send_json(200, {'probabilities': self.server.service.get_probabilities()})
+        else:
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path == '/polls':
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                polls = {(poll['state'], poll['candidate']): float(poll['pct'])
+                         for poll in json.loads(self.rfile.read(length))}
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {'error': f'Malformed polls: {e}'})
+                return
+            updated_states = service.update_polls(polls)
+        elif self.path == '/reload':
+            updated_states = service.reload_polls()
+        else:
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        self.send_json(200, {'updated_states': updated_states, 'probabilities': service.get_probabilities()})
+
+    def send_json(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_server(service: ForecastService, host='127.0.0.1', port=8000) -> ThreadingHTTPServer:
+    """Builds an HTTP server that serves the given forecast service. Call serve_forever() on it to start serving.
+
+    :param service: the forecast service to serve
+    :param host: the address to listen on. Defaults to the local machine only.
+    :param port: the port to listen on
+    :returns the HTTP server"""
+    server = ThreadingHTTPServer((host, port), ForecastRequestHandler)
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    candidates_names = [('Joseph R. Biden Jr.', 'D', 'Biden'), ('Donald Trump', 'R', 'Trump'),
+                        ('Jo Jorgensen', 'L', 'Jorgensen'), ('Howie Hawkins', 'G', 'Hawkins')]
+    candidates = [Candidate(*can) for can in candidates_names]
+
+    forecast_service = ForecastService(candidates, PollingData())
+    print('Probability:', forecast_service.get_probabilities())
+    http_server = make_server(forecast_service)
+    print(f'Serving forecasts on http://{http_server.server_address[0]}:{http_server.server_address[1]}/forecast')
+    http_server.serve_forever()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+
+class ResultCache:
+    """Stores the results of simulation runs on disk, keyed by a hash of everything that determines them.
+
+    Each entry holds the outcome of every simulation of a run in order, so a request for fewer simulations is served
+    from the start of a longer run, and a request for more simulations only needs to run the missing ones. Entries
+    are evicted least recently used first once the cache grows past its size limit."""
+
+    def __init__(self, directory='data/cache', max_bytes=50 * 1024 ** 2):
+        """
+
+        :param directory: the directory the entries are stored in. It is created if it does not exist.
+        :param max_bytes: the total size the entries may take on disk before the least recently used are evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(inputs: dict) -> str:
+        """:param inputs: JSON-serializable dict of everything that determines the results
+        :returns a hex digest that identifies the inputs"""
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> list:
+        """Looks up the outcomes stored for a key and marks the entry as recently used.
+
+        :param key: a key from make_key
+        :returns the list of stored outcomes, or an empty list if there are none"""
+        path = self.get_path(key)
+        try:
+            with open(path, 'r') as f:
+                outcomes = json.load(f)['outcomes']
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # Missing, unreadable, or evicted by another process between the read and the touch
+            return []
+        return outcomes
+
+    def put(self, key: str, outcomes: list):
+        """Stores the outcomes for a key, replacing any stored before, then evicts entries past the size limit.
+
+        :param key: a key from make_key
+        :param outcomes: JSON-serializable outcome of each simulation, in order"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(key)
+        # Write to a temporary file first, so that a concurrent reader never sees a partially written entry
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({'outcomes': outcomes}, f, separators=(',', ':'))
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits within max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except FileNotFoundError:
+                    continue  # Another process evicted it first
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another process evicted it first
@@ -0,0 +1,14 @@
+from PollingData import PollingData
+
+
+def make_polling_data(polls=None) -> PollingData:
+    """Builds polling data with a close race between Biden and Trump in every state, so tests never download polls.
+
+    :param polls: dict with (state name, candidate name) as keys and polling averages to override as values
+    :returns the polling data"""
+    polling_data = PollingData()
+    for state_name in polling_data.list_of_state_names:
+        polling_data.polling_dictionary[(state_name, 'Biden')] = .48
+        polling_data.polling_dictionary[(state_name, 'Trump')] = .46
+    polling_data.polling_dictionary.update(polls or {})
+    return polling_data
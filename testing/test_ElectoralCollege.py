@@ -1,6 +1,16 @@
-from unittest import TestCase
+import multiprocessing
+import tempfile
+from unittest import TestCase, mock
 from ElectoralCollege import ElectoralCollege
 from Candidate import Candidate
+from ResultCache import ResultCache
+from electoral_votes import total_electoral_votes
+from testing import make_polling_data
+
+
+class FailingElectoralCollege(ElectoralCollege):
+    def each_iteration(self, i, candidates, verbose, write_in_candidate):
+        raise ValueError(f'Simulation {i} failed')
 
 
 class TestElectoralCollege(TestCase):
@@ -23,4 +33,69 @@ class TestElectoralCollege(TestCase):
         self.assertEqual(analysis, {c1: 18, c2: 58})
 
     def test_get_winner(self):
-        pass
\ No newline at end of file
+        pass
+
+    def test_run_simulations_result_cache(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        polling_data = make_polling_data()
+        uncached = ElectoralCollege(polling_data, parallel=False, seed=1).run_simulations(10, candidates)
+
+        with tempfile.TemporaryDirectory() as directory:
+            ec = ElectoralCollege(polling_data, parallel=False, result_cache=ResultCache(directory), seed=1)
+            ec.run_simulations(4, candidates)
+            self.assertEqual(len(ec.get_cached_simulations(candidates)), 4)
+            # The stored simulations are extended, and match a run without the cache
+            self.assertEqual(ec.run_simulations(10, candidates), uncached)
+            self.assertEqual(sum(ec.run_simulations(3, candidates).values()), 3)
+
+            cached_simulations = ec.get_cached_simulations(candidates)
+            self.assertEqual(len(cached_simulations), 10)
+            for candidate_sums in cached_simulations:
+                self.assertEqual(sum(candidate_sums.values()), total_electoral_votes)
+
+    def test_run_simulations_verbose_skips_cache(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        with tempfile.TemporaryDirectory() as directory:
+            ec = ElectoralCollege(make_polling_data(), parallel=False, result_cache=ResultCache(directory))
+            with mock.patch.object(ec, 'save_simulation_to_csv') as save_simulation_to_csv:
+                ec.run_simulations(3, candidates, verbose=True)
+            self.assertEqual(save_simulation_to_csv.call_count, 3)
+            self.assertEqual(ec.get_cached_simulations(candidates), [])
+
+    def test_iterate_simulations(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        ec = ElectoralCollege(make_polling_data(), parallel=False)
+        batches = list(ec.iterate_simulations(range(7), candidates, batch_size=3))
+        self.assertEqual([batch for batch, _ in batches], [range(0, 3), range(3, 6), range(6, 7)])
+        self.assertEqual([len(batch_sums) for _, batch_sums in batches], [3, 3, 1])
+
+    def test_run_simulations_parallel(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        polling_data = make_polling_data()
+        serial = ElectoralCollege(polling_data, parallel=False, seed=1).run_simulations(10, candidates)
+        parallel = ElectoralCollege(polling_data, parallel=True, seed=1).run_simulations(10, candidates)
+        self.assertEqual(serial, parallel)
+
+    def test_iterate_simulations_parallel(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        ec = ElectoralCollege(make_polling_data(), parallel=True)
+        with mock.patch('ElectoralCollege.NUM_CPU', None):  # os.cpu_count() can return None
+            batches = list(ec.iterate_simulations(range(7), candidates, batch_size=2))
+        # Batches come back in the order they finish, but every simulation is run exactly once
+        self.assertEqual(sorted(i for batch, _ in batches for i in batch), list(range(7)))
+        self.assertEqual(sum(len(batch_sums) for _, batch_sums in batches), 7)
+
+    def test_iterate_simulations_close(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        ec = ElectoralCollege(make_polling_data(), parallel=True)
+        simulations = ec.iterate_simulations(range(10000), candidates, batch_size=2)
+        batch, batch_sums = next(simulations)
+        self.assertEqual(len(batch_sums), 2)
+        simulations.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_iterate_simulations_worker_error(self):
+        candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        ec = FailingElectoralCollege(make_polling_data(), parallel=True)
+        with self.assertRaises(ValueError):
+            list(ec.iterate_simulations(range(4), candidates))
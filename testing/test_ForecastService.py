@@ -0,0 +1,105 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest import TestCase, mock
+
+import numpy as np
+
+from Candidate import Candidate
+from ForecastService import ForecastService, make_server
+from StateFunction import State
+from testing import make_polling_data
+
+
+class TestForecastService(TestCase):
+    def setUp(self) -> None:
+        self.candidates = [Candidate('Biden', 'D'), Candidate('Trump', 'R')]
+        self.polling_data = make_polling_data()
+        self.service = ForecastService(self.candidates, self.polling_data, num_simulations=200, seed=0)
+
+    def test_get_win_counts(self):
+        win_counts = self.service.get_win_counts()
+        self.assertEqual(sum(win_counts.values()), 200)
+        self.assertIn(None, win_counts)
+
+    def test_get_affected_states(self):
+        affected = self.service.get_affected_states({'Texas'})
+        self.assertIn('Texas', affected)
+        self.assertLess(len(affected), len(self.service.electoral_votes))
+
+    def test_update_polls_matches_full_forecast(self):
+        polls = {('Texas', 'Biden'): .30, ('Texas', 'Trump'): .65}
+        updated_states = self.service.update_polls(polls)
+        self.assertIn('Texas', updated_states)
+
+        fresh_service = ForecastService(self.candidates, make_polling_data(polls), num_simulations=200, seed=0)
+        self.assertTrue(np.array_equal(self.service.candidate_sums, fresh_service.candidate_sums))
+        self.assertEqual(self.service.get_win_counts(), fresh_service.get_win_counts())
+
+    def test_update_polls_unchanged(self):
+        self.assertEqual(self.service.update_polls({('Texas', 'Biden'): .48}), [])
+
+    def test_simulate_state_matches_state(self):
+        service = ForecastService(self.candidates, self.polling_data, num_simulations=1000, seed=0)
+        state = State('Pennsylvania', self.polling_data)
+        outcomes = self.candidates + [service.write_in_candidate]
+        distribution = service.get_distribution('Pennsylvania')
+        draws = service.get_vote_draws('Pennsylvania')
+        winners = service.simulate_state('Pennsylvania')
+
+        num_ties = 0
+        for i in range(service.num_simulations):
+            # Replay the service's voter draws through State, so both see exactly the same votes
+            with mock.patch('StateFunction.random.random', side_effect=draws[i].tolist()):
+                winner = state.get_winner_with_distribution(self.candidates, distribution[i].tolist())
+            self.assertEqual(outcomes[winners[i]], winner)
+            num_ties += np.count_nonzero(draws[i] < distribution[i, 0]) * 2 == service.population
+        self.assertGreater(num_ties, 0)  # Ties have to be broken the same way as well
+
+
+class TestForecastServer(TestCase):
+    def setUp(self) -> None:
+        self.polling_data = make_polling_data()
+        self.service = ForecastService([Candidate('Biden', 'D'), Candidate('Trump', 'R')], self.polling_data,
+                                       num_simulations=200, seed=0)
+        self.server = make_server(self.service, port=0)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, path, body=None):
+        request = urllib.request.Request(self.url + path, data=body, method='GET' if body is None else 'POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_get_forecast(self):
+        status, body = self.request('/forecast')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['probabilities'], self.service.get_probabilities())
+
+    def test_post_polls(self):
+        polls = [{'state': 'Texas', 'candidate': 'Biden', 'pct': .30},
+                 {'state': 'Texas', 'candidate': 'Trump', 'pct': .65}]
+        status, body = self.request('/polls', json.dumps(polls).encode())
+        self.assertEqual(status, 200)
+        self.assertIn('Texas', body['updated_states'])
+        self.assertEqual(body['probabilities'], self.service.get_probabilities())
+        self.assertEqual(self.polling_data.polling_dictionary[('Texas', 'Trump')], .65)
+
+    def test_post_malformed_polls(self):
+        status, body = self.request('/polls', json.dumps([{'state': 'Texas'}]).encode())
+        self.assertEqual(status, 400)
+        self.assertIn('error', body)
+        status, body = self.request('/polls', b'not json')
+        self.assertEqual(status, 400)
+
+    def test_unknown_path(self):
+        self.assertEqual(self.request('/unknown')[0], 404)
+        self.assertEqual(self.request('/unknown', b'[]')[0], 404)
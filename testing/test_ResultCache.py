@@ -0,0 +1,68 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from ResultCache import ResultCache
+
+
+class TestResultCache(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+
+class TestMakeKey(TestResultCache):
+    def test_make_key(self):
+        self.assertEqual(self.cache.make_key({'a': 1, 'b': [2, 3]}), self.cache.make_key({'b': [2, 3], 'a': 1}))
+        self.assertNotEqual(self.cache.make_key({'a': 1}), self.cache.make_key({'a': 2}))
+
+
+class TestGetPut(TestResultCache):
+    def test_miss(self):
+        self.assertEqual(self.cache.get('missing'), [])
+
+    def test_put_get(self):
+        self.cache.put('key', [0, 1, 1, 3])
+        self.assertEqual(self.cache.get('key'), [0, 1, 1, 3])
+        self.cache.put('key', [0, 1, 1, 3, 2])
+        self.assertEqual(self.cache.get('key'), [0, 1, 1, 3, 2])
+
+    def test_evicted_between_read_and_touch(self):
+        self.cache.put('key', [0, 1])
+        utime = os.utime
+
+        def evict_then_touch(path):
+            os.remove(path)  # Another process evicts the entry right after it was read
+            utime(path)
+
+        with mock.patch('ResultCache.os.utime', side_effect=evict_then_touch):
+            self.assertEqual(self.cache.get('key'), [])
+
+
+class TestEvict(TestResultCache):
+    def test_evict_least_recently_used(self):
+        self.cache.put('old', [0] * 100)
+        self.cache.put('new', [1] * 100)
+        os.utime(self.cache.get_path('old'), (0, 0))
+        os.utime(self.cache.get_path('new'), (1, 1))
+        self.cache.get('old')  # Marks 'old' as the most recently used
+
+        self.cache.max_bytes = os.path.getsize(self.cache.get_path('old'))
+        self.cache.evict()
+        self.assertEqual(self.cache.get('old'), [0] * 100)
+        self.assertEqual(self.cache.get('new'), [])
+
+    def test_evicted_by_another_process(self):
+        self.cache.put('key', [0] * 100)
+        self.cache.max_bytes = 0
+        listdir = os.listdir
+
+        # Entries that another process deletes while this one is evicting are skipped
+        with mock.patch('ResultCache.os.listdir', side_effect=lambda path: listdir(path) + ['evicted.json']), \
+                mock.patch('ResultCache.os.remove', side_effect=FileNotFoundError):
+            self.cache.evict()
+        self.cache.evict()
+        self.assertEqual(self.cache.get('key'), [])